@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Demo script for Email Document Assistant"""
 import sys
+import asyncio
 sys.path.insert(0, '/Users/akarnik/interactionInterview/interaction-challenge')
 
 from src.server import _process_email_automation
@@ -11,7 +12,7 @@ print("EMAIL DOCUMENT ASSISTANT - DEMO")
 print("=" * 60)
 print("\nProcessing: https://interaction.co/assets/easy-pdf.json\n")
 
-result = _process_email_automation("https://interaction.co/assets/easy-pdf.json")
+result = asyncio.run(_process_email_automation("https://interaction.co/assets/easy-pdf.json"))
 
 print("=" * 60)
 if result["status"] == "success":
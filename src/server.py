@@ -4,11 +4,22 @@ Email Document Assistant - MCP Server
 Automatically fills PDF forms from incoming emails
 """
 import os
+import re
+import time
+import asyncio
+import hashlib
+import tempfile
 import httpx
-import pymupdf  # PyMuPDF
+import orjson
 from fastmcp import FastMCP
 from dotenv import load_dotenv
 from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pymupdf  # PyMuPDF
 
 # Load environment variables
 load_dotenv()
@@ -25,37 +36,168 @@ mcp = FastMCP("Email Document Assistant")
 WORK_DIR = Path("/tmp/mcp_pdfs")
 WORK_DIR.mkdir(exist_ok=True)
 
+DOWNLOAD_CHUNK_SIZE = 1 << 16
 
-def _download_pdf(url: str) -> dict:
-    """Download a PDF file from a URL."""
+# Upper bound on attachments from one email processed at the same time
+MAX_CONCURRENT_PDFS = 8
+
+DRIVE_URL_RE = re.compile(r'https://drive\.google\.com/[^\s\'"]+')
+
+MONTH_MAP = {
+    "january": "01", "february": "02", "march": "03", "april": "04",
+    "may": "05", "june": "06", "july": "07", "august": "08",
+    "september": "09", "october": "10", "november": "11", "december": "12"
+}
+
+# Fallback values for commonly missed fields
+FIELD_DEFAULTS = {
+    "Month": "03", "Day": "15",
+    "Seller State": "CA", "Buyer State": "CA",
+    "Sell zip": "90210", "Buyer zip": "90210",
+    "Sell date 1": "03/15/2025", "Sell date 2": "",
+}
+
+# Generated form values keyed by the form's field-name signature
+LLM_CACHE_DIR = WORK_DIR / "llm_cache"
+LLM_CACHE_DIR.mkdir(exist_ok=True)
+LLM_CACHE_TTL_DAYS = 7
+
+
+def _sweep_llm_cache(ttl_days: int = LLM_CACHE_TTL_DAYS) -> None:
+    """Delete cached LLM responses older than ``ttl_days``."""
+    cutoff = time.time() - ttl_days * 86400
+    for entry in LLM_CACHE_DIR.glob("*.json"):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                entry.unlink()
+        except OSError:
+            pass
+
+
+def _llm_cache_path(field_names: list) -> Path:
+    """Return the cache file for a set of field names, independent of their order."""
+    key = hashlib.sha256("\x00".join(sorted(field_names)).encode()).hexdigest()
+    return LLM_CACHE_DIR / f"{key}.json"
+
+
+def _write_llm_cache(cache_path: Path, values: dict) -> None:
+    """Atomically write generated values so concurrent readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=LLM_CACHE_DIR, suffix=".tmp")
     try:
-        response = httpx.get(url, follow_redirects=True, timeout=30.0)
-        response.raise_for_status()
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps(values))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+_sweep_llm_cache()
+
+# Extracted form fields keyed by the sha256 of the PDF bytes, least recently used first
+FIELDS_CACHE_SIZE = 128
+_FIELDS_CACHE = OrderedDict()
+
+
+# PyMuPDF is not thread-safe, so all PDF work runs on one dedicated worker
+# thread; this keeps blocking MuPDF calls off the event loop without running
+# them concurrently
+_PDF_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pymupdf")
+
+
+async def _run_pdf_job(func, *args):
+    """Run a blocking PyMuPDF call on the PDF worker thread."""
+    return await asyncio.get_running_loop().run_in_executor(_PDF_EXECUTOR, func, *args)
+
+
+def _open_pdf(pdf_path: str) -> "pymupdf.Document":
+    """Import PyMuPDF if needed and open ``pdf_path``; meant to run on the PDF worker."""
+    import pymupdf  # PyMuPDF
+    return pymupdf.open(pdf_path)
+
 
-        filename = url.split("/")[-1] or "downloaded.pdf"
-        if not filename.endswith(".pdf"):
-            filename += ".pdf"
+_HTTP_CLIENT = None
 
-        filepath = WORK_DIR / filename
-        filepath.write_bytes(response.content)
+
+def _http_client() -> httpx.AsyncClient:
+    """Return the pooled async HTTP client shared across requests.
+
+    The client is created once and reused for the life of the process (one
+    event loop); callers driving other loops should pass their own client.
+    HTTP/2 is left off so large PDF downloads can spread across several TCP
+    connections instead of being multiplexed over one.
+    """
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            http2=False,
+            follow_redirects=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=8)
+        )
+    return _HTTP_CLIENT
+
+
+def _pdf_filename(url: str) -> str:
+    """Derive a local .pdf filename from a download URL."""
+    filename = url.split("/")[-1] or "downloaded.pdf"
+    if not filename.endswith(".pdf"):
+        filename += ".pdf"
+    return filename
+
+
+async def _download_pdf(client: httpx.AsyncClient, url: str) -> dict:
+    """Download a PDF file from a URL."""
+    filepath = None
+    try:
+        size_bytes = 0
+        digest = hashlib.sha256()
+
+        # Every download gets its own file: concurrent requests often share a
+        # URL basename (e.g. Drive ".../view" links) and must not overwrite
+        # each other's PDF
+        fd, filepath = tempfile.mkstemp(dir=WORK_DIR, prefix=f"{Path(_pdf_filename(url)).stem}-", suffix=".pdf")
+
+        # Stream straight to disk so memory stays bounded by the chunk size
+        with os.fdopen(fd, "wb") as f:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(f.write, chunk)
+                    digest.update(chunk)
+                    size_bytes += len(chunk)
 
         return {
             "status": "success",
             "message": f"Downloaded PDF to {filepath}",
-            "filepath": str(filepath),
-            "size_bytes": len(response.content)
+            "filepath": filepath,
+            "size_bytes": size_bytes,
+            "sha256": digest.hexdigest()
         }
     except Exception as e:
+        # Never leave a partial PDF behind
+        if filepath is not None:
+            Path(filepath).unlink(missing_ok=True)
         return {"status": "error", "message": f"Failed to download PDF: {str(e)}"}
 
 
-def _parse_email(email_json_url: str) -> dict:
+def _iter_strings(node):
+    """Yield every string leaf of a nested JSON structure."""
+    if isinstance(node, str):
+        yield node
+    elif isinstance(node, dict):
+        for value in node.values():
+            yield from _iter_strings(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _iter_strings(item)
+
+
+async def _parse_email(client: httpx.AsyncClient, email_json_url: str) -> dict:
     """Parse an email JSON file and extract PDF attachment URLs."""
     try:
-        import re
-        response = httpx.get(email_json_url, timeout=30.0)
+        response = await client.get(email_json_url)
         response.raise_for_status()
-        email_data = response.json()
+        email_data = orjson.loads(response.content)
 
         sender = email_data.get("sender", {})
         subject = email_data.get("subject", "")
@@ -67,10 +209,9 @@ def _parse_email(email_json_url: str) -> dict:
         for part in parts:
             filename = part.get("filename", "")
             if filename.endswith(".pdf"):
-                if "drive.google.com" in str(part):
-                    part_str = str(part)
-                    drive_links = re.findall(r'https://drive\.google\.com/[^\s\'"]+', part_str)
-                    pdf_urls.extend(drive_links)
+                for text in _iter_strings(part):
+                    if "drive.google.com" in text:
+                        pdf_urls.extend(DRIVE_URL_RE.findall(text))
 
         return {
             "status": "success",
@@ -86,141 +227,218 @@ def _parse_email(email_json_url: str) -> dict:
 def _extract_form_fields(pdf_path: str) -> dict:
     """Extract all form fields from a PDF."""
     try:
+        import pymupdf  # PyMuPDF
         doc = pymupdf.open(pdf_path)
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to extract form fields: {str(e)}"}
+    try:
+        return _extract_document_fields(doc, pdf_path)
+    finally:
+        doc.close()
+
+
+def _extract_document_fields(doc: "pymupdf.Document", pdf_path: str) -> dict:
+    """Extract all form fields from an already-open PDF document."""
+    try:
         fields = {}
+        widgets = {}
 
         for page_num in range(len(doc)):
             page = doc[page_num]
-            widgets = page.widgets()
-            if widgets:
-                for widget in widgets:
-                    fields[widget.field_name] = {
-                        "type": widget.field_type_string,
-                        "value": widget.field_value or "",
-                        "page": page_num
-                    }
-        doc.close()
+            for widget in page.widgets():
+                fields[widget.field_name] = {
+                    "type": widget.field_type_string,
+                    "value": widget.field_value or "",
+                    "page": page_num
+                }
+                # Remember where each widget lives so filling can jump straight to it
+                widgets.setdefault(widget.field_name, []).append((page_num, widget.xref))
 
         return {
             "status": "success",
             "filepath": pdf_path,
             "num_fields": len(fields),
-            "fields": fields
+            "fields": fields,
+            "widgets": widgets
         }
     except Exception as e:
         return {"status": "error", "message": f"Failed to extract form fields: {str(e)}"}
 
 
-def _generate_form_values(field_names: list) -> dict:
-    """Use OpenAI to generate realistic fill values for form fields."""
-    import json
-    try:
-        from openai import OpenAI
-        from langfuse.openai import openai as langfuse_openai
+# Kept fixed across calls so the provider can reuse the cached prompt prefix
+FORM_VALUES_SYSTEM_PROMPT = """Fill form fields with realistic but fake sample data (names, addresses, phones).
+- Month/Day/Year fields: 2 digits (01-12, 01-31, 20-25)
+- Full dates like "Sell date 1": MM/DD/YYYY
+- State: 2-letter code like "CA"; zip: 5 digits
+- Fields ending in " 2": "" unless there is genuinely a second person/item"""
 
-        # Initialize OpenAI client with Langfuse observability
-        client = langfuse_openai.OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+# Forms with more fields than this are split into parallel requests
+FORM_VALUES_MAX_SINGLE_CALL = 30
+FORM_VALUES_CHUNK_SIZE = 25
 
-        prompt = f"""Generate realistic sample data for a form with the following fields.
+_OPENAI_CLIENT = None
 
-IMPORTANT: Use these EXACT field names as JSON keys (preserve spacing, capitalization):
-{chr(10).join(f'"{name}"' for name in field_names)}
 
-CRITICAL RULES:
-- Fill EVERY SINGLE field in the list above - do not skip any
-- For date fields (Month, Day, Year): use 2-digit format (01-12, 01-31, 20-25)
-- For dates with full format (like "Sell date 1"): use MM/DD/YYYY format
-- For State fields: use 2-letter codes like "CA", "NY", "TX"
-- For zip codes: use 5-digit format like "90210" or "12345"
-- Use realistic but fake names, addresses, phone numbers
-- For fields ending with " 2": Only fill if there are genuinely 2 different people/items, otherwise leave empty ("")
+def _get_openai_client():
+    """Return the shared OpenAI client, importing and constructing it on first use."""
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        if os.getenv("LANGFUSE_SECRET_KEY"):
+            # Initialize OpenAI client with Langfuse observability
+            from langfuse.openai import openai
+        else:
+            # No Langfuse keys configured, so skip the tracing wrapper entirely
+            import openai
+        _OPENAI_CLIENT = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY")
+        )
+    return _OPENAI_CLIENT
+
+
+async def _request_form_values(field_names: list) -> dict:
+    """Ask the model for values for exactly ``field_names`` in a single call."""
+    client = _get_openai_client()
+
+    # The schema pins the exact keys, so the prompt only carries formatting rules
+    schema = {
+        "type": "object",
+        "properties": {name: {"type": "string"} for name in field_names},
+        "required": list(field_names),
+        "additionalProperties": False
+    }
+
+    response = await client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": FORM_VALUES_SYSTEM_PROMPT},
+            {"role": "user", "content": "Fill every field in the schema."}
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "form", "schema": schema, "strict": True}
+        },
+        timeout=20.0
+    )
 
-Return ONLY a JSON object with ALL the field names above filled.
-Example: {{"Name": "John Smith", "State": "CA", "Month": "03", "Day": "15", "Zip": "90210", "Date": "03/15/2025"}}"""
+    return orjson.loads(response.choices[0].message.content)
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            timeout=20.0
-        )
 
-        values = json.loads(response.choices[0].message.content)
+async def _generate_form_values(field_names: list) -> dict:
+    """Use OpenAI to generate realistic fill values for form fields."""
+    try:
+        cache_path = _llm_cache_path(field_names)
+        if cache_path.exists():
+            values = orjson.loads(cache_path.read_bytes())
+            return {"status": "success", "generated_values": values, "fields_filled": len(values), "cached": True}
+
+        if len(field_names) <= FORM_VALUES_MAX_SINGLE_CALL:
+            values = await _request_form_values(field_names)
+        else:
+            # Large forms: fan out smaller requests and merge the answers
+            chunks = [field_names[i:i + FORM_VALUES_CHUNK_SIZE]
+                      for i in range(0, len(field_names), FORM_VALUES_CHUNK_SIZE)]
+            values = {}
+            for chunk_values in await asyncio.gather(*[_request_form_values(c) for c in chunks]):
+                values.update(chunk_values)
+
+        _write_llm_cache(cache_path, values)
         return {"status": "success", "generated_values": values, "fields_filled": len(values)}
     except Exception as e:
         return {"status": "error", "message": f"Failed to generate values: {str(e)}"}
 
 
-def _fill_pdf_form(pdf_path: str, field_values: dict) -> dict:
+def _fill_pdf_form(pdf_path: str, field_values: dict, persist: bool = True) -> dict:
     """Fill a PDF form with the provided field values."""
-    import base64
     try:
+        import pymupdf  # PyMuPDF
         doc = pymupdf.open(pdf_path)
-        processed_values = {}
+    except Exception as e:
+        return {"status": "error", "message": f"Failed to fill PDF: {str(e)}"}
+    try:
+        return _fill_document(doc, pdf_path, field_values, persist=persist)
+    finally:
+        doc.close()
 
-        month_map = {
-            "january": "01", "february": "02", "march": "03", "april": "04",
-            "may": "05", "june": "06", "july": "07", "august": "08",
-            "september": "09", "october": "10", "november": "11", "december": "12"
-        }
 
+def _fill_document(doc: "pymupdf.Document", pdf_path: str, field_values: dict, widgets: dict = None,
+                   persist: bool = True) -> dict:
+    """Fill an already-open PDF document and save it next to ``pdf_path``.
+
+    ``widgets`` is the ``{field_name: [(page_num, xref), ...]}`` map returned by
+    ``_extract_form_fields``; when given, only the widgets being filled are loaded.
+    With ``persist=False`` nothing is written and only ``pdf_base64`` is returned.
+    """
+    import base64
+    try:
+        processed_values = {}
+
+        # Month normalization and year detection in a single pass over the keys
+        current_year = None
+        second_row_keys = []
         for key, value in field_values.items():
-            if "month" in key.lower() and str(value).lower() in month_map:
-                processed_values[key] = month_map[str(value).lower()]
-            else:
-                processed_values[key] = value
+            lower_key = key.lower()
+            if "month" in lower_key:
+                value = MONTH_MAP.get(str(value).lower(), value)
+            if current_year is None and ("yr" in lower_key or "year" in lower_key):
+                str_value = str(value)
+                if len(str_value) == 4 and str_value.isdigit():
+                    current_year = str_value
+            if key.endswith(" 2"):
+                second_row_keys.append(key)
+            processed_values[key] = value
 
         # Handle year split
-        current_year = "2025"
-        for key, value in processed_values.items():
-            if "yr" in key.lower() or "year" in key.lower():
-                if len(str(value)) == 4 and str(value).isdigit():
-                    current_year = str(value)
-                    break
-
+        current_year = current_year or "2025"
         processed_values["Year-1"] = current_year[0]
         processed_values["Year-2"] = current_year[1]
         processed_values["Year-3"] = current_year[2]
         processed_values["Year-4"] = current_year[3]
 
         # Defaults
-        defaults = {
-            "Month": "03", "Day": "15",
-            "Seller State": "CA", "Buyer State": "CA",
-            "Sell zip": "90210", "Buyer zip": "90210",
-            "Sell date 1": "03/15/2025", "Sell date 2": "",
-        }
-        for field, default_value in defaults.items():
-            if field not in processed_values or not processed_values.get(field):
+        for field, default_value in FIELD_DEFAULTS.items():
+            if not processed_values.get(field):
                 processed_values[field] = default_value
 
         # Clear duplicate seller row
         first_seller = processed_values.get("Print seller's name", "") or processed_values.get("Seller print name 1", "")
         second_seller = processed_values.get("Seller print name 2", "")
         if not second_seller or second_seller == first_seller:
-            for key in list(processed_values.keys()):
-                if key.endswith(" 2"):
-                    processed_values[key] = ""
+            for key in second_row_keys:
+                processed_values[key] = ""
 
         # Fill form
         fields_filled = 0
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            for widget in page.widgets():
-                if widget.field_name in processed_values:
-                    widget.field_value = str(processed_values[widget.field_name])
+        if widgets is not None:
+            pages = {}
+            for name in processed_values.keys() & widgets.keys():
+                for page_num, xref in widgets[name]:
+                    if page_num not in pages:
+                        pages[page_num] = doc[page_num]
+                    widget = pages[page_num].load_widget(xref)
+                    widget.field_value = str(processed_values[name])
                     widget.update()
                     fields_filled += 1
-
-        output_path = str(Path(pdf_path).with_stem(Path(pdf_path).stem + "_filled"))
-        doc.save(output_path)
-        doc.close()
-
-        # Encode as base64
-        with open(output_path, 'rb') as f:
-            pdf_base64 = base64.b64encode(f.read()).decode('utf-8')
+        else:
+            for page_num in range(len(doc)):
+                # Keep the page referenced while its widgets are updated
+                page = doc[page_num]
+                widgets_by_name = {}
+                for widget in page.widgets():
+                    widgets_by_name.setdefault(widget.field_name, []).append(widget)
+                for name in processed_values.keys() & widgets_by_name.keys():
+                    value = str(processed_values[name])
+                    for widget in widgets_by_name[name]:
+                        widget.field_value = value
+                        widget.update()
+                        fields_filled += 1
+
+        # Serialize once (compacted) and reuse the bytes for disk and base64
+        pdf_bytes = doc.tobytes(garbage=4, deflate=True)
+        output_path = None
+        if persist:
+            output_path = str(Path(pdf_path).with_stem(Path(pdf_path).stem + "_filled"))
+            Path(output_path).write_bytes(pdf_bytes)
+        pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
 
         return {
             "status": "success",
@@ -234,92 +452,156 @@ def _fill_pdf_form(pdf_path: str, field_values: dict) -> dict:
         return {"status": "error", "message": f"Failed to fill PDF: {str(e)}"}
 
 
-def _process_email_automation(email_json_url: str) -> dict:
+async def _process_email_automation(email_json_url: str, persist: bool = True,
+                                    client: httpx.AsyncClient = None) -> dict:
     """Complete end-to-end: Parse email, download PDF, fill forms with AI, return filled PDF."""
     try:
+        client = client or _http_client()
+
         # Step 1: Parse email
-        email_result = _parse_email(email_json_url)
+        email_result = await _parse_email(client, email_json_url)
         if email_result["status"] != "success" or not email_result.get("pdf_urls"):
             return {"status": "error", "message": "No PDF found in email"}
 
-        pdf_url = email_result["pdf_urls"][0]
+        pdf_urls = email_result["pdf_urls"]
+
+        if len(pdf_urls) == 1:
+            result = await _process_single_pdf(client, pdf_urls[0], persist=persist)
+            if result["status"] != "success":
+                return result
+            return {
+                "status": "success",
+                "email_subject": email_result["subject"],
+                **result,
+                "message": f"✅ Successfully filled {result['fields_filled']} fields!"
+            }
+
+        # Attachments are independent, so process them concurrently
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PDFS)
+
+        async def process(pdf_url: str) -> dict:
+            async with semaphore:
+                return await _process_single_pdf(client, pdf_url, persist)
+
+        results = await asyncio.gather(
+            *[process(url) for url in pdf_urls],
+            return_exceptions=True
+        )
+        results = [
+            {"status": "error", "message": f"Processing failed: {str(r)}"} if isinstance(r, BaseException) else r
+            for r in results
+        ]
+
+        succeeded = [r for r in results if r["status"] == "success"]
+        total_filled = sum(r["fields_filled"] for r in succeeded)
+        return {
+            "status": "success" if succeeded else "error",
+            "email_subject": email_result["subject"],
+            "pdf_count": len(pdf_urls),
+            "fields_filled": total_filled,
+            "results": results,
+            "message": f"✅ Filled {total_filled} fields across {len(succeeded)} of {len(pdf_urls)} PDFs"
+            if succeeded else "Failed to process any PDF in email"
+        }
+    except Exception as e:
+        return {"status": "error", "message": f"Processing failed: {str(e)}"}
+
 
+async def _process_single_pdf(client: httpx.AsyncClient, pdf_url: str, persist: bool = True) -> dict:
+    """Download, extract, generate values for, and fill one PDF attachment."""
+    try:
         # Step 2: Download PDF
-        download_result = _download_pdf(pdf_url)
+        download_result = await _download_pdf(client, pdf_url)
         if download_result["status"] != "success":
             return download_result
 
         pdf_path = download_result["filepath"]
 
-        # Step 3: Extract form fields
-        extract_result = _extract_form_fields(pdf_path)
-        if extract_result["status"] != "success":
-            return extract_result
-
-        if extract_result["num_fields"] == 0:
-            return {"status": "info", "message": "PDF has no fillable form fields"}
-
-        # Step 4: Generate values with AI
-        excluded_patterns = ["Year-1", "Year-2", "Year-3", "Year-4"]
-        field_names = [name for name in extract_result["fields"].keys()
-                       if extract_result["fields"][name]["type"] != "Button"
-                       and name not in excluded_patterns]
-
-        gen_result = _generate_form_values(field_names)
-        if gen_result["status"] != "success":
-            return gen_result
-
-        # Step 5: Fill PDF
-        fill_result = _fill_pdf_form(pdf_path, gen_result["generated_values"])
+        # Keep one parsed document open for both extraction and filling
+        doc = await _run_pdf_job(_open_pdf, pdf_path)
+        try:
+            # Step 3: Extract form fields (reused when the same template was seen before)
+            content_hash = download_result["sha256"]
+            extract_result = _FIELDS_CACHE.get(content_hash)
+            if extract_result is not None:
+                _FIELDS_CACHE.move_to_end(content_hash)
+                extract_result = {**extract_result, "filepath": pdf_path}
+            else:
+                extract_result = await _run_pdf_job(_extract_document_fields, doc, pdf_path)
+                if extract_result["status"] != "success":
+                    return extract_result
+                _FIELDS_CACHE[content_hash] = extract_result
+                if len(_FIELDS_CACHE) > FIELDS_CACHE_SIZE:
+                    _FIELDS_CACHE.popitem(last=False)
+
+            if extract_result["num_fields"] == 0:
+                return {"status": "info", "message": "PDF has no fillable form fields"}
+
+            # Step 4: Generate values with AI
+            excluded_patterns = ["Year-1", "Year-2", "Year-3", "Year-4"]
+            field_names = [name for name in extract_result["fields"].keys()
+                           if extract_result["fields"][name]["type"] != "Button"
+                           and name not in excluded_patterns]
+
+            gen_result = await _generate_form_values(field_names)
+            if gen_result["status"] != "success":
+                return gen_result
+
+            # Step 5: Fill PDF
+            fill_result = await _run_pdf_job(
+                _fill_document, doc, pdf_path, gen_result["generated_values"], extract_result["widgets"], persist
+            )
+            if fill_result["status"] != "success":
+                return fill_result
+        finally:
+            await _run_pdf_job(doc.close)
 
         return {
             "status": "success",
-            "email_subject": email_result["subject"],
             "original_pdf": pdf_path,
             "filled_pdf": fill_result["output_path"],
             "fields_filled": fill_result["fields_filled"],
             "pdf_base64": fill_result.get("pdf_base64", ""),
-            "download_instructions": fill_result.get("download_instructions", ""),
-            "message": f"✅ Successfully filled {fill_result['fields_filled']} fields!"
+            "download_instructions": fill_result.get("download_instructions", "")
         }
     except Exception as e:
         return {"status": "error", "message": f"Processing failed: {str(e)}"}
 
 
 @mcp.tool(description="Download a PDF from a URL and save it locally")
-def download_pdf(url: str) -> dict:
+async def download_pdf(url: str) -> dict:
     """Download a PDF file from a URL."""
-    return _download_pdf(url)
+    return await _download_pdf(_http_client(), url)
 
 
 @mcp.tool(description="Parse email JSON and extract PDF attachment URLs")
-def parse_email(email_json_url: str) -> dict:
+async def parse_email(email_json_url: str) -> dict:
     """Parse an email JSON file and extract PDF attachment URLs."""
-    return _parse_email(email_json_url)
+    return await _parse_email(_http_client(), email_json_url)
 
 
 @mcp.tool(description="Extract form fields from a PDF file")
-def extract_form_fields(pdf_path: str) -> dict:
+async def extract_form_fields(pdf_path: str) -> dict:
     """Extract all form fields from a PDF."""
-    return _extract_form_fields(pdf_path)
+    return await _run_pdf_job(_extract_form_fields, pdf_path)
 
 
 @mcp.tool(description="Use AI to generate realistic values for PDF form fields")
-def generate_form_values(field_names: list) -> dict:
+async def generate_form_values(field_names: list) -> dict:
     """Use OpenAI to generate realistic fill values for form fields."""
-    return _generate_form_values(field_names)
+    return await _generate_form_values(field_names)
 
 
 @mcp.tool(description="Fill a PDF form with provided values and save result")
-def fill_pdf_form(pdf_path: str, field_values: dict) -> dict:
+async def fill_pdf_form(pdf_path: str, field_values: dict, persist: bool = True) -> dict:
     """Fill a PDF form with the provided field values."""
-    return _fill_pdf_form(pdf_path, field_values)
+    return await _run_pdf_job(_fill_pdf_form, pdf_path, field_values, persist)
 
 
 @mcp.tool(description="Process email with PDF form - complete automation from email to filled PDF")
-def process_email_automation(email_json_url: str) -> dict:
+async def process_email_automation(email_json_url: str, persist: bool = True) -> dict:
     """Complete end-to-end: Parse email, download PDF, fill forms with AI, return filled PDF."""
-    return _process_email_automation(email_json_url)
+    return await _process_email_automation(email_json_url, persist)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""Tests for the full-scan fill path used by the fill_pdf_form tool."""
+import base64
+import sys
+from pathlib import Path
+
+import pymupdf
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.server import _fill_document, _fill_pdf_form  # noqa: E402
+
+
+def _make_form(path: Path) -> None:
+    """Write a two-page form with text widgets spread across both pages."""
+    doc = pymupdf.open()
+    for page_num in range(2):
+        page = doc.new_page()
+        for i in range(3):
+            widget = pymupdf.Widget()
+            widget.field_type = pymupdf.PDF_WIDGET_TYPE_TEXT
+            widget.field_name = f"Field {page_num}-{i}"
+            widget.rect = pymupdf.Rect(50, 50 + i * 40, 300, 80 + i * 40)
+            page.add_widget(widget)
+    doc.save(path)
+    doc.close()
+
+
+def _widget_values(pdf_bytes: bytes) -> dict:
+    doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return {w.field_name: w.field_value for page in doc for w in page.widgets()}
+    finally:
+        doc.close()
+
+
+def test_fill_document_without_widget_map_fills_every_page(tmp_path):
+    pdf_path = tmp_path / "form.pdf"
+    _make_form(pdf_path)
+    values = {f"Field {p}-{i}": f"value {p}-{i}" for p in range(2) for i in range(3)}
+
+    doc = pymupdf.open(pdf_path)
+    try:
+        result = _fill_document(doc, str(pdf_path), values, persist=False)
+    finally:
+        doc.close()
+
+    assert result["status"] == "success", result.get("message")
+    assert result["fields_filled"] == 6
+    assert result["output_path"] is None
+    assert _widget_values(base64.b64decode(result["pdf_base64"])) == values
+
+
+def test_fill_pdf_form_writes_filled_copy(tmp_path):
+    pdf_path = tmp_path / "form.pdf"
+    _make_form(pdf_path)
+
+    result = _fill_pdf_form(str(pdf_path), {"Field 1-2": "hello"})
+
+    assert result["status"] == "success", result.get("message")
+    assert result["fields_filled"] == 1
+    assert _widget_values(Path(result["output_path"]).read_bytes())["Field 1-2"] == "hello"